@@ -0,0 +1,319 @@
+import io
+import sys
+import json
+import argparse
+import datetime
+import contextlib
+
+from mortgage_smart_calculator import add_hacker_args
+
+
+def run_installments(args):
+    # yaml is only needed here
+    from hacker_installments import yaml_reader, HackerInstallment, watch
+
+    if args.db:
+        run_installments_db(args)
+        return
+
+    if args.watch:
+        watch(args.yaml_file, plan_months=args.plan_months, interval=args.interval)
+        return
+
+    installments = yaml_reader(args.yaml_file)
+
+    hi = HackerInstallment(installments)
+    hi.main(plan_months=args.plan_months)
+
+
+def run_installments_db(args):
+    from hacker_installments_store import SqliteHackerInstallment, PAIED_BILLS_MONTHS
+
+    account = args.account
+    # report on the account just imported into, not the whole database
+    if args.yaml_file and account is None:
+        account = ''
+
+    paied_bills_months = PAIED_BILLS_MONTHS if args.paied_bills_months is None else args.paied_bills_months
+    if paied_bills_months < 0:
+        paied_bills_months = None
+
+    hi = SqliteHackerInstallment(args.db, account=account)
+
+    try:
+        if args.yaml_file:
+            hi.import_yaml(args.yaml_file, account=account)
+
+        if args.export:
+            hi.export_yaml(args.export)
+
+        hi.main(
+            plan_months=args.plan_months,
+            first_month=args.first_month,
+            last_month=args.last_month,
+            since=args.since,
+            paied_bills_months=paied_bills_months,
+        )
+    finally:
+        hi.close()
+
+
+def month(value):
+    try:
+        datetime.datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError('{}: must be YYYY-MM'.format(value))
+
+    return value
+
+
+def run_mortgage(args):
+    from mortgage_smart_calculator import MortgageSmartCalculator
+
+    msc = MortgageSmartCalculator(
+        loan_amount=args.loan_amount,
+        loan_term=args.loan_term,
+        interest_rate=args.interest_rate,
+        repayment_month_serial_number=args.repayment_month_serial_number,
+    )
+    msc.main()
+
+
+def run_qrcode(args):
+    # qrcode, numpy and PIL are only needed here
+    from hacker_qrcode import QRCode, QRCodeChunks
+
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            data = f.read()
+    else:
+        data = args.data
+
+    if args.chunk_size:
+        chunks = QRCodeChunks(data, chunk_size=args.chunk_size, box_size=args.box_size, border=args.border)
+
+        if args.sprite:
+            print(chunks.create_qrcode_sprite(args.output))
+        else:
+            for save_path in chunks.create_qrcode_pngs(save_dir=args.save_dir):
+                print(save_path)
+        return
+
+    qr = QRCode(data, box_size=args.box_size, border=args.border, fit=True, compress_switch=args.compress)
+
+    if args.txt:
+        print(qr.creat_qrcode_txt(args.output))
+    else:
+        print(qr.create_qrcode_png(args.output))
+
+
+def hacker_parser():
+    parser = argparse.ArgumentParser(prog='hacker')
+    parser.add_argument(
+        "--serve-stdin",
+        dest="serve_stdin", action="store_true",
+        help="keep one process running, read ndjson requests from stdin, e.g. {\"argv\": [\"mortgage\", \"-a\", \"100\", \"-t\", \"30\", \"-r\", \"0.031\"]}"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    installments = subparsers.add_parser("installments", help="分期账单分析")
+    installments.add_argument(
+        "yaml_file",
+        nargs="?",
+        action="store",
+        help="分期账单 yaml 文件路径, 指定 --db 时导入到数据库"
+    )
+    installments.add_argument(
+        "-p",
+        "--plan_months",
+        dest="plan_months", action="store", type=int, required=False,
+        default=3,
+        help="未来还款计划月数"
+    )
+    installments.add_argument(
+        "-w",
+        "--watch",
+        dest="watch", action="store_true",
+        help="文件变化时增量重新分析"
+    )
+    installments.add_argument(
+        "-i",
+        "--interval",
+        dest="interval", action="store", type=float, default=1.0,
+        help="watch 模式下检查文件的间隔, 单位: 秒"
+    )
+    installments.add_argument(
+        "--db",
+        dest="db", action="store", default=None,
+        help="sqlite 数据库路径, 按月查询分析"
+    )
+    installments.add_argument(
+        "--account",
+        dest="account", action="store", default=None,
+        help="数据库中的账户, 导入 yaml_file 时默认为空账户并只分析该账户, 否则默认分析全部账户"
+    )
+    installments.add_argument(
+        "--export",
+        dest="export", action="store", default=None,
+        help="将数据库中的分期导出为 yaml 文件"
+    )
+    installments.add_argument(
+        "--first_month",
+        dest="first_month", action="store", type=month, default=None,
+        help="--db 模式下, 贷款信息只统计首次还款月不早于该月的分期, 格式: YYYY-MM"
+    )
+    installments.add_argument(
+        "--last_month",
+        dest="last_month", action="store", type=month, default=None,
+        help="--db 模式下, 贷款信息只统计首次还款月不晚于该月的分期, 格式: YYYY-MM"
+    )
+    installments.add_argument(
+        "--since",
+        dest="since", action="store", type=month, default=None,
+        help="--db 模式下, 已还清账单只统计该月及之后结束的, 格式: YYYY-MM"
+    )
+    installments.add_argument(
+        "--paied_bills_months",
+        dest="paied_bills_months", action="store", type=int, default=None,
+        help="--db 模式下, 未指定 --since 时只列出最近几个月结束的已还清账单, 默认使用 PAIED_BILLS_MONTHS, 负数列出全部"
+    )
+    installments.set_defaults(func=run_installments)
+
+    mortgage = subparsers.add_parser("mortgage", help="房贷计算")
+    add_hacker_args(mortgage)
+    mortgage.set_defaults(func=run_mortgage)
+
+    qr = subparsers.add_parser("qrcode", help="生成二维码")
+    qr_data = qr.add_mutually_exclusive_group(required=True)
+    qr_data.add_argument(
+        "data",
+        nargs="?",
+        help="二维码内容"
+    )
+    qr_data.add_argument(
+        "-f",
+        "--file",
+        dest="file", action="store",
+        help="从文件读取二维码内容"
+    )
+    qr.add_argument(
+        "-o",
+        "--output",
+        dest="output", action="store", default=None,
+        help="输出文件路径"
+    )
+    qr.add_argument(
+        "--txt",
+        dest="txt", action="store_true",
+        help="输出 ascii 文本而不是 png"
+    )
+    qr.add_argument(
+        "-c",
+        "--compress",
+        dest="compress", action="store_true",
+        help="gzip + base64 压缩内容"
+    )
+    qr.add_argument(
+        "-s",
+        "--chunk_size",
+        dest="chunk_size", action="store", type=int, default=0,
+        help="内容超出单个二维码时, 按该长度拆分为多个二维码"
+    )
+    qr.add_argument(
+        "--sprite",
+        dest="sprite", action="store_true",
+        help="拆分后的二维码合并为一张图片"
+    )
+    qr.add_argument(
+        "-d",
+        "--save_dir",
+        dest="save_dir", action="store", default="/tmp",
+        help="拆分后的二维码保存目录"
+    )
+    qr.add_argument(
+        "--box_size",
+        dest="box_size", action="store", type=int, default=10,
+        help="每个模块的像素数"
+    )
+    qr.add_argument(
+        "--border",
+        dest="border", action="store", type=int, default=4,
+        help="边框模块数"
+    )
+    qr.set_defaults(func=run_qrcode)
+
+    return parser
+
+
+def run(parser, args):
+    if args.command is None:
+        parser.error("a subcommand is required")
+
+    if args.command == "installments" and args.yaml_file is None and args.db is None:
+        parser.error("installments: yaml_file or --db is required")
+
+    if args.command == "installments" and args.watch and args.db is not None:
+        parser.error("installments: --watch can not be used with --db")
+
+    if args.command == "qrcode" and args.output is None:
+        args.output = '/tmp/qrcode_sprite.png' if args.sprite else '/tmp/qrcode.txt' if args.txt else '/tmp/qrcode.png'
+
+    args.func(args)
+
+
+def serve_stdin(parser):
+    """
+    Desc: handle one ndjson request per line until stdin is closed
+        request: {"id": 1, "argv": ["installments", "/path/to/installments.yml"]}
+        response: {"id": 1, "ok": true, "output": "..."}
+        heavy modules are imported by the first request that needs them and stay warm.
+
+    Returns: None
+    """
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        response = dict()
+        output = io.StringIO()
+
+        try:
+            request = json.loads(line)
+            response['id'] = request.get('id')
+
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                args = parser.parse_args([str(x) for x in request['argv']])
+
+                # watch never returns, it would block the worker forever
+                if getattr(args, 'watch', False):
+                    raise Exception('--watch is not supported with --serve-stdin.')
+
+                run(parser, args)
+
+            response['ok'] = True
+        except SystemExit as e:
+            # argparse reports usage errors through sys.exit
+            response['ok'] = e.code in (0, None)
+        except Exception as e:
+            response['ok'] = False
+            response['error'] = "{}: {}".format(type(e).__name__, e)
+
+        response['output'] = output.getvalue()
+
+        sys.stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = hacker_parser()
+    args = parser.parse_args(argv)
+
+    if args.serve_stdin:
+        serve_stdin(parser)
+    else:
+        run(parser, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,9 @@ import os
 import sys
 import yaml
 import json
+import time
 import datetime
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -154,6 +155,47 @@ class HackerInstallment(object):
         year_str = date_str.split('-')[0]
         return year_str
 
+    def bill_key(self, installment):
+        first_repayment_month = installment['first_repayment_month']
+        last_repayment_month = self.add_months(first_repayment_month, installment['number_of_installments'] - 1)
+
+        return "{} ~ {}：{} / {}".format(
+            first_repayment_month, last_repayment_month,
+            installment['total_installment_amount'], installment['number_of_installments']
+        )
+
+    def check_installment(self, installment):
+        """
+        Desc: reject a half edited installment before it is used
+        """
+        if not isinstance(installment, dict):
+            raise Exception('{}: installment must be a mapping.'.format(installment))
+
+        for k in ('total_installment_amount', 'monthly_payment', 'monthly_interest'):
+            if isinstance(installment.get(k), bool) or not isinstance(installment.get(k), (int, float)):
+                raise Exception('{}: {} must be a number, got {!r}.'.format(dict(installment), k, installment.get(k)))
+
+        number_of_installments = installment.get('number_of_installments')
+        if isinstance(number_of_installments, bool) or not isinstance(number_of_installments, int) or number_of_installments < 1:
+            raise Exception('{}: number_of_installments must be a positive integer, got {!r}.'.format(
+                dict(installment), number_of_installments
+            ))
+
+        first_repayment_month = installment.get('first_repayment_month')
+        try:
+            datetime.datetime.strptime(first_repayment_month, '%Y-%m')
+        except (TypeError, ValueError):
+            raise Exception('{}: first_repayment_month must be YYYY-MM, got {!r}.'.format(
+                dict(installment), first_repayment_month
+            ))
+
+    def check_installments(self, installments_list):
+        if not isinstance(installments_list, list):
+            raise Exception('installments must be a list, got {}.'.format(type(installments_list).__name__))
+
+        for installment in installments_list:
+            self.check_installment(installment)
+
     def hacker_print(self, contents):
         if isinstance(contents, (dict, list)):
             print(json.dumps(contents, indent=2, ensure_ascii=False))
@@ -244,7 +286,7 @@ class HackerInstallment(object):
             monthly_payment = installment['monthly_payment']
             monthly_interest = installment['monthly_interest']
             number_of_installments = installment['number_of_installments']
-            bill_key = "{} ~ {}：{} / {}".format(first_repayment_month, last_repayment_month, total_installment_amount, number_of_installments)
+            bill_key = self.bill_key(installment)
 
             # if all(bill_key not in x.keys() for x in current_month_repayment):
             if last_repayment_month < self.current_month:
@@ -284,12 +326,7 @@ class HackerInstallment(object):
         for installment in self.installments_list:
             for num in range(installment['number_of_installments']):
                 repayment_month = self.add_months(installment['first_repayment_month'], num)
-                _key = "{} ~ {}：{} / {}".format(
-                    installment['first_repayment_month'],
-                    self.add_months(installment['first_repayment_month'], installment['number_of_installments'] - 1),
-                    installment['total_installment_amount'],
-                    installment['number_of_installments'],
-                )
+                _key = self.bill_key(installment)
                 _value = installment['monthly_payment'] + installment['monthly_interest']
 
                 if repayment_month in _monthly_bills:
@@ -323,19 +360,334 @@ class HackerInstallment(object):
 
         return plan
 
-    def main(self):
-        plan_months = 3
-
+    def report(self, loan, bills, plan):
         info = self.round_floats({
-            "贷款信息": self.analyze_loan(),
-            "还款情况": self.analyze_bills(),
-            # "未来计划": self.analyze_repayments_plan(plan_months)
-            "未来计划": {k: [f"{next(iter(item.keys()))}: {item[next(iter(item.keys()))]:.2f}" for item in v] for k, v in self.analyze_repayments_plan(plan_months).items()}
+            "贷款信息": loan,
+            "还款情况": bills,
+            # "未来计划": plan
+            "未来计划": {k: [f"{next(iter(item.keys()))}: {item[next(iter(item.keys()))]:.2f}" for item in v] for k, v in plan.items()}
         })
+
+        return info
+
+    def main(self, plan_months=3):
+        info = self.report(self.analyze_loan(), self.analyze_bills(), self.analyze_repayments_plan(plan_months))
         
         self.hacker_print(info)
 
 
+class IncrementalHackerInstallment(HackerInstallment):
+    """
+    Desc: HackerInstallment which keeps the month and year aggregates in memory
+        update() diffs a new installments list against the current one and only touches
+        the years, months and bill totals of the installments which were added or removed.
+        Bills ending in the same month are listed in file order, same as HackerInstallment.
+    """
+    def __init__(self, installments_list):
+        super(IncrementalHackerInstallment, self).__init__(list())
+
+        self._bills = Counter()
+        self._installments = dict()
+        # identity of every installment in file order, and the file positions of each identity
+        self._order = list()
+        self._positions = dict()
+        self._loan = dict()
+        self._monthly_bills = dict()
+        self._paied_info = self._empty_bills_info(['total'])
+        self._unpaied_info = self._empty_bills_info(['total', 'paied', 'unpaied'])
+
+        self.update(installments_list)
+
+    def _empty_bills_info(self, buckets):
+        info = {x: {"amount": 0, "principal": 0, "interest": 0} for x in buckets}
+        info['bills'] = Counter()
+
+        return info
+
+    def bill_identity(self, installment):
+        return (
+            installment['first_repayment_month'],
+            installment['number_of_installments'],
+            installment['total_installment_amount'],
+            installment['monthly_payment'],
+            installment['monthly_interest'],
+        )
+
+    def _add_amounts(self, bucket, amount, principal, interest, sign):
+        bucket['amount'] += sign * amount
+        bucket['principal'] += sign * principal
+        bucket['interest'] += sign * interest
+
+    def _apply_loan(self, installment, sign):
+        year = self.date_str_to_year(installment['first_repayment_month'])
+        principal = installment['total_installment_amount']
+        interest = installment['monthly_interest'] * installment['number_of_installments']
+
+        if year not in self._loan:
+            self._loan[year] = {'total': 0, 'principal': 0, 'interest': 0, 'count': 0}
+
+        self._loan[year]['total'] += sign * (principal + interest)
+        self._loan[year]['principal'] += sign * principal
+        self._loan[year]['interest'] += sign * interest
+        self._loan[year]['count'] += sign
+
+        if self._loan[year]['count'] == 0:
+            del self._loan[year]
+
+    def _apply_monthly_repayments(self, identity, sign):
+        installment = self._installments[identity]
+
+        for num in range(installment['number_of_installments']):
+            repayment_month = self.add_months(installment['first_repayment_month'], num)
+            bills = self._monthly_bills.setdefault(repayment_month, Counter())
+            bills[identity] += sign
+
+            if bills[identity] == 0:
+                del bills[identity]
+
+                if not bills:
+                    del self._monthly_bills[repayment_month]
+
+    def _apply_bills(self, identity, sign):
+        """
+        Desc: same arithmetic as HackerInstallment.analyze_bills, for a single installment
+        """
+        installment = self._installments[identity]
+        first_repayment_month = installment['first_repayment_month']
+        last_repayment_month = self.add_months(first_repayment_month, installment['number_of_installments'] - 1)
+        total_installment_amount = installment['total_installment_amount']
+        monthly_payment = installment['monthly_payment']
+        monthly_interest = installment['monthly_interest']
+        number_of_installments = installment['number_of_installments']
+        total_interest = number_of_installments * monthly_interest
+
+        if last_repayment_month < self.current_month:
+            info = self._paied_info
+        else:
+            info = self._unpaied_info
+
+            paied_months = self.month_diff(self.current_month, first_repayment_month)
+            self._add_amounts(
+                info['paied'], (monthly_payment + monthly_interest) * paied_months,
+                monthly_payment * paied_months, monthly_interest * paied_months, sign
+            )
+
+            unpaied_months = self.month_diff(self.current_month, last_repayment_month) + 1
+            self._add_amounts(
+                info['unpaied'], (monthly_payment + monthly_interest) * unpaied_months,
+                monthly_payment * unpaied_months, monthly_interest * unpaied_months, sign
+            )
+
+        self._add_amounts(
+            info['total'], total_installment_amount + total_interest,
+            total_installment_amount, total_interest, sign
+        )
+
+        info['bills'][identity] += sign
+        if info['bills'][identity] == 0:
+            del info['bills'][identity]
+
+    def _apply(self, identity, sign):
+        installment = self._installments[identity]
+
+        self._apply_loan(installment, sign)
+        self._apply_monthly_repayments(identity, sign)
+        self._apply_bills(identity, sign)
+
+    def update(self, installments_list):
+        """
+        Desc: diff installments_list against the current one by bill identity
+        Args:
+            installments_list: the newly loaded installments
+
+        Returns: (added, removed) count
+        """
+        # validate everything first, a failure must leave the aggregates untouched
+        self.check_installments(installments_list)
+
+        bills = Counter()
+        installments = dict()
+        order = list()
+        positions = dict()
+
+        for position, installment in enumerate(installments_list):
+            identity = self.bill_identity(installment)
+            bills[identity] += 1
+            installments.setdefault(identity, installment)
+            order.append(identity)
+            positions.setdefault(identity, list()).append(position)
+
+        for identity, installment in installments.items():
+            self._installments.setdefault(identity, installment)
+
+        removed = self._bills - bills
+        added = bills - self._bills
+
+        for identity, count in removed.items():
+            for _ in range(count):
+                self._apply(identity, -1)
+
+        for identity, count in added.items():
+            for _ in range(count):
+                self._apply(identity, 1)
+
+        for identity in removed:
+            if identity not in bills:
+                del self._installments[identity]
+
+        self._bills = bills
+        self._order = order
+        self._positions = positions
+        self.installments_list = list(installments_list)
+
+        return sum(added.values()), sum(removed.values())
+
+    def roll_over(self, today=None):
+        """
+        Desc: move current_month to today, only bill totals depend on it
+            moving forward, paied bills stay paied, so only unpaied bills are recalculated.
+
+        Returns: True if current_month changed
+        """
+        today = today or datetime.datetime.now()
+        current_month = "{}-{:02d}".format(today.year, today.month)
+        self.today = today
+
+        if current_month == self.current_month:
+            return False
+
+        if current_month > self.current_month:
+            identities = [
+                x for x in self._bills
+                if self.add_months(x[0], x[1] - 1) >= self.current_month
+            ]
+        else:
+            identities = list(self._bills)
+
+        # year and month aggregates do not depend on current_month
+        for identity in identities:
+            for _ in range(self._bills[identity]):
+                self._apply_bills(identity, -1)
+
+        self.current_month = current_month
+
+        for identity in identities:
+            for _ in range(self._bills[identity]):
+                self._apply_bills(identity, 1)
+
+        return True
+
+    def generate_loan_list(self):
+        loan = {
+            year: {k: v for k, v in x.items() if k != 'count'}
+            for year, x in self._loan.items()
+        }
+
+        return self.sorted_dict(loan)
+
+    def _in_file_order(self, identities):
+        """
+        Desc: every installment of identities, in the order they appear in the file
+            all installments of one identity always share the same month and bill status.
+        """
+        positions = sorted(p for identity in identities for p in self._positions[identity])
+
+        return [self._installments[self._order[p]] for p in positions]
+
+    def _monthly_bills_list(self, month):
+        return [
+            {self.bill_key(x): self.round_floats(x['monthly_payment'] + x['monthly_interest'])}
+            for x in self._in_file_order(self._monthly_bills.get(month, dict()))
+        ]
+
+    def analyze_bills(self):
+        paied_info = {k: dict(v) for k, v in self._paied_info.items() if k != 'bills'}
+        unpaied_info = {k: dict(v) for k, v in self._unpaied_info.items() if k != 'bills'}
+        paied_info['bills'] = self.sort_by_end_date([self.bill_key(x) for x in self._in_file_order(self._paied_info['bills'])])
+        unpaied_info['bills'] = self.sort_by_end_date([self.bill_key(x) for x in self._in_file_order(self._unpaied_info['bills'])])
+
+        bills = {
+            "paied_bills": paied_info,
+            "unpaied_bills": unpaied_info
+        }
+
+        return bills
+
+    def generate_monthly_repayments(self):
+        return {k: self._monthly_bills_list(k) for k in self._monthly_bills}
+
+    def analyze_repayments_plan(self, plan_months=-1):
+        """
+        Desc: same as HackerInstallment.analyze_repayments_plan, but an empty list gives
+            an empty plan and a month without repayments gives amount 0, the file being
+            watched can be emptied or have gaps while it is edited.
+        """
+        if not self._monthly_bills:
+            return dict()
+
+        max_month = max(self._monthly_bills.keys())
+        plan = dict()
+        n = 0
+
+        while True:
+            if plan_months > -1 and n >= plan_months:
+                break
+
+            next_month = self.add_months(self.current_month, n)
+
+            if next_month > max_month:
+                break
+
+            plan[next_month] = self.sort_by_end_date(self._monthly_bills_list(next_month))
+            plan[next_month].insert(0, {'amount': sum((list(i.values())[0] for i in plan[next_month]))})
+            n += 1
+
+        return plan
+
+
+def watch(yaml_file, plan_months=3, interval=1.0):
+    """
+    Desc: reprint the analysis every time yaml_file changes, until interrupted
+    Args:
+        yaml_file: the path of installments yaml file
+        plan_months: the number of months of repayments plan
+        interval: seconds between two checks of the file mtime
+
+    Returns: None
+    """
+    def render(hi):
+        try:
+            hi.main(plan_months)
+        except Exception as e:
+            print('{}: {}'.format(yaml_file, e), file=sys.stderr)
+
+    mtime = os.stat(yaml_file).st_mtime_ns
+    hi = IncrementalHackerInstallment(yaml_reader(yaml_file) or list())
+    render(hi)
+
+    try:
+        while True:
+            time.sleep(interval)
+            changed = hi.roll_over()
+
+            try:
+                _mtime = os.stat(yaml_file).st_mtime_ns
+                if _mtime != mtime:
+                    mtime = _mtime
+                    hi.update(yaml_reader(yaml_file) or list())
+                    # a reordered file changes the listing order too
+                    changed = True
+            except Exception as e:
+                # keep the last good state while the file is being edited
+                print('{}: {}'.format(yaml_file, e), file=sys.stderr)
+                continue
+
+            if changed:
+                render(hi)
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == '__main__':
     # installments = [
     #     {
@@ -0,0 +1,298 @@
+import sqlite3
+from collections import OrderedDict
+
+from hacker_installments import yaml_reader, yaml_writer, HackerInstallment
+
+
+INSTALLMENT_FIELDS = (
+    'total_installment_amount',
+    'monthly_payment',
+    'monthly_interest',
+    'number_of_installments',
+    'first_repayment_month',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS installments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL DEFAULT '',
+    -- no type affinity, so 17 and 17.0 from yaml are exported unchanged
+    total_installment_amount NOT NULL,
+    monthly_payment NOT NULL,
+    monthly_interest NOT NULL,
+    number_of_installments INTEGER NOT NULL,
+    first_repayment_month TEXT NOT NULL,
+    start_month INTEGER NOT NULL,
+    end_month INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_installments_start_month ON installments (start_month);
+CREATE INDEX IF NOT EXISTS idx_installments_end_month ON installments (end_month);
+CREATE INDEX IF NOT EXISTS idx_installments_account_start_month ON installments (account, start_month);
+CREATE INDEX IF NOT EXISTS idx_installments_account_end_month ON installments (account, end_month);
+"""
+
+# paied bills listed by analyze_bills by default, totals still cover all history
+PAIED_BILLS_MONTHS = 12
+
+
+class SqliteHackerInstallment(HackerInstallment):
+    """
+    Desc: HackerInstallment backed by a sqlite database instead of an in-memory list
+        months are stored as integers (year * 12 + month - 1) with indexes on the first
+        and the last repayment month, with and without account, every analysis is an
+        aggregate query over the requested months only.
+    """
+    def __init__(self, db_path, account=None):
+        """
+        Args:
+            db_path: the path of sqlite database, created if not exist
+            account: only analyze installments of this account, None means all accounts
+
+        Returns: None
+        """
+        super(SqliteHackerInstallment, self).__init__(list())
+
+        self.db_path = db_path
+        self.account = account
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def month_to_index(self, date_str):
+        year, month = map(int, date_str.split('-'))
+        return year * 12 + month - 1
+
+    def index_to_month(self, index):
+        year, month = divmod(index, 12)
+        return "{}-{:02d}".format(year, month + 1)
+
+    def _where(self, *conditions, **params):
+        conditions = list(conditions)
+
+        if self.account is not None:
+            conditions.append('account = :account')
+            params['account'] = self.account
+
+        where = ' WHERE {}'.format(' AND '.join(conditions)) if conditions else ''
+
+        return where, params
+
+    def import_yaml(self, yaml_file, account=''):
+        """
+        Desc: replace the installments of account with the contents of yaml_file
+            nothing is changed if any installment in yaml_file is invalid
+
+        Returns: the number of installments imported
+        """
+        installments = yaml_reader(yaml_file) or list()
+        # reject a bad file before the transaction, the account keeps its rows
+        self.check_installments(installments)
+        rows = list()
+
+        for x in installments:
+            start_month = self.month_to_index(x['first_repayment_month'])
+            rows.append((account,) + tuple(x[k] for k in INSTALLMENT_FIELDS) + (start_month, start_month + x['number_of_installments'] - 1))
+
+        with self.conn:
+            self.conn.execute('DELETE FROM installments WHERE account = ?', (account,))
+            self.conn.executemany(
+                'INSERT INTO installments (account, {}, start_month, end_month) VALUES ({})'.format(
+                    ', '.join(INSTALLMENT_FIELDS), ', '.join('?' * (len(INSTALLMENT_FIELDS) + 3))
+                ),
+                rows
+            )
+
+        return len(rows)
+
+    def export_yaml(self, yaml_file):
+        where, params = self._where()
+        cursor = self.conn.execute(
+            'SELECT {} FROM installments{} ORDER BY id'.format(', '.join(INSTALLMENT_FIELDS), where),
+            params
+        )
+        contents = [OrderedDict(zip(INSTALLMENT_FIELDS, row)) for row in cursor]
+
+        return yaml_writer(contents, yaml_file)
+
+    def generate_loan_list(self, first_month=None, last_month=None):
+        conditions = list()
+        params = dict()
+        if first_month is not None:
+            conditions.append('start_month >= :first_month')
+            params['first_month'] = self.month_to_index(first_month)
+        if last_month is not None:
+            conditions.append('start_month <= :last_month')
+            params['last_month'] = self.month_to_index(last_month)
+
+        where, params = self._where(*conditions, **params)
+        cursor = self.conn.execute(
+            'SELECT substr(first_repayment_month, 1, 4) AS year, '
+            'SUM(total_installment_amount + monthly_interest * number_of_installments), '
+            'SUM(total_installment_amount), '
+            'SUM(monthly_interest * number_of_installments) '
+            'FROM installments{} GROUP BY year ORDER BY year'.format(where),
+            params
+        )
+
+        loan = {
+            year: {'total': total, 'principal': principal, 'interest': interest}
+            for year, total, principal, interest in cursor
+        }
+
+        return loan
+
+    def analyze_loan(self, first_month=None, last_month=None):
+        """
+        Desc: same as HackerInstallment.analyze_loan, limited to installments whose
+            first repayment month is between first_month and last_month
+        """
+        loan = self.generate_loan_list(first_month, last_month)
+        loan_info = {
+            "info": {
+                'total': round(sum((x['total'] for x in loan.values())), 2),
+                'principal': round(sum((x['principal'] for x in loan.values())), 2),
+                'interest': round(sum((x['interest'] for x in loan.values())), 2),
+            },
+            "detail": loan
+        }
+
+        return loan_info
+
+    def _bill_keys(self, conditions, params):
+        where, params = self._where(*conditions, **params)
+        cursor = self.conn.execute(
+            'SELECT {} FROM installments{} ORDER BY end_month, id'.format(', '.join(INSTALLMENT_FIELDS), where),
+            params
+        )
+
+        return [self.bill_key(dict(zip(INSTALLMENT_FIELDS, row))) for row in cursor]
+
+    def analyze_bills(self, since=None, paied_bills_months=PAIED_BILLS_MONTHS):
+        """
+        Desc: same as HackerInstallment.analyze_bills
+        Args:
+            since: only count paied bills which ended in or after this month, None means all history
+            paied_bills_months: when since is None, only list paied bills which ended in the last
+                paied_bills_months months, so the list does not grow with history. None lists all.
+
+        Returns: bills
+        """
+        params = {'current': self.month_to_index(self.current_month)}
+        paied_conditions = ['end_month < :current']
+        if since is not None:
+            paied_conditions.append('end_month >= :since')
+            params['since'] = self.month_to_index(since)
+        listed_conditions = list(paied_conditions)
+        if since is None and paied_bills_months is not None:
+            listed_conditions.append('end_month >= :listed_since')
+            params['listed_since'] = params['current'] - paied_bills_months
+        unpaied_conditions = ['end_month >= :current']
+
+        where, _params = self._where(*paied_conditions, **params)
+        amount, principal, interest = self.conn.execute(
+            'SELECT '
+            'TOTAL(total_installment_amount + number_of_installments * monthly_interest), '
+            'TOTAL(total_installment_amount), '
+            'TOTAL(number_of_installments * monthly_interest) '
+            'FROM installments{}'.format(where),
+            _params
+        ).fetchone()
+        paied_info = {
+            "total": {"amount": amount, "principal": principal, "interest": interest},
+            "bills": self._bill_keys(listed_conditions, params),
+        }
+
+        # paied months use abs() like HackerInstallment.month_diff
+        where, _params = self._where(*unpaied_conditions, current=params['current'])
+        row = self.conn.execute(
+            'SELECT '
+            'TOTAL(total_installment_amount + number_of_installments * monthly_interest), '
+            'TOTAL(total_installment_amount), '
+            'TOTAL(number_of_installments * monthly_interest), '
+            'TOTAL((monthly_payment + monthly_interest) * ABS(:current - start_month)), '
+            'TOTAL(monthly_payment * ABS(:current - start_month)), '
+            'TOTAL(monthly_interest * ABS(:current - start_month)), '
+            'TOTAL((monthly_payment + monthly_interest) * (end_month - :current + 1)), '
+            'TOTAL(monthly_payment * (end_month - :current + 1)), '
+            'TOTAL(monthly_interest * (end_month - :current + 1)) '
+            'FROM installments{}'.format(where),
+            _params
+        ).fetchone()
+        unpaied_info = {
+            "total": {"amount": row[0], "principal": row[1], "interest": row[2]},
+            "paied": {"amount": row[3], "principal": row[4], "interest": row[5]},
+            "unpaied": {"amount": row[6], "principal": row[7], "interest": row[8]},
+            "bills": self._bill_keys(unpaied_conditions, _params),
+        }
+
+        bills = {
+            "paied_bills": paied_info,
+            "unpaied_bills": unpaied_info
+        }
+
+        return bills
+
+    def analyze_repayments_plan(self, plan_months=-1):
+        """
+        Desc: same as HackerInstallment.analyze_repayments_plan, only installments
+            overlapping the planned months are read from the database
+        """
+        where, params = self._where()
+        max_month = self.conn.execute('SELECT MAX(end_month) FROM installments{}'.format(where), params).fetchone()[0]
+        first_month = self.month_to_index(self.current_month)
+
+        if max_month is None or max_month < first_month:
+            return dict()
+
+        last_month = max_month if plan_months < 0 else min(max_month, first_month + plan_months - 1)
+        if last_month < first_month:
+            return dict()
+
+        plan = {self.index_to_month(m): list() for m in range(first_month, last_month + 1)}
+
+        where, params = self._where(
+            'start_month <= :last_month', 'end_month >= :first_month',
+            first_month=first_month, last_month=last_month
+        )
+        cursor = self.conn.execute(
+            'SELECT start_month, end_month, {} FROM installments{} ORDER BY end_month, id'.format(
+                ', '.join(INSTALLMENT_FIELDS), where
+            ),
+            params
+        )
+
+        for row in cursor:
+            start, end = row[:2]
+            installment = dict(zip(INSTALLMENT_FIELDS, row[2:]))
+            bill = {
+                self.bill_key(installment):
+                    self.round_floats(installment['monthly_payment'] + installment['monthly_interest'])
+            }
+
+            for m in range(max(start, first_month), min(end, last_month) + 1):
+                plan[self.index_to_month(m)].append(bill)
+
+        for month, bills in plan.items():
+            bills.insert(0, {'amount': sum((list(i.values())[0] for i in bills))})
+
+        return plan
+
+    def main(self, plan_months=3, first_month=None, last_month=None, since=None, paied_bills_months=PAIED_BILLS_MONTHS):
+        """
+        Desc: same as HackerInstallment.main, only the requested months are queried
+        Args:
+            plan_months: the number of months of repayments plan
+            first_month, last_month: see analyze_loan
+            since, paied_bills_months: see analyze_bills
+
+        Returns: None
+        """
+        info = self.report(
+            self.analyze_loan(first_month, last_month),
+            self.analyze_bills(since, paied_bills_months),
+            self.analyze_repayments_plan(plan_months),
+        )
+
+        self.hacker_print(info)
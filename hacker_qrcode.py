@@ -1,9 +1,12 @@
 import io
+import os
 import gzip
 import json
+import zlib
 import base64
+import struct
 import qrcode
-import qrcode.image.svg
+import numpy as np
 
 
 class QRCode(object):
@@ -49,7 +52,8 @@ class QRCode(object):
 
         self.qr = self.__init_qrcode()
 
-    def compress(self, data):
+    @staticmethod
+    def compress(data):
         if type(data) != str:
             data = json.dumps(data)
 
@@ -58,7 +62,8 @@ class QRCode(object):
 
         return _base64_data
     
-    def decompress(self, compressed_data):
+    @staticmethod
+    def decompress(compressed_data):
         _base64_data = base64.b64decode(compressed_data)
         decompressed_data = gzip.decompress(_base64_data).decode(encoding='utf-8')
 
@@ -96,13 +101,225 @@ class QRCode(object):
         return save_path
 
     def create_qrcode_png(self, save_path='/tmp/qrcode.png'):
-        img = self.qr.make_image(fill_color="black", back_color="white")
+        with open(save_path, 'wb') as f:
+            f.write(self.make_png_bytes())
+
+        return save_path
+
+    def make_png_bytes(self):
+        """
+        Desc: render the module matrix into a 1-bit grayscale png without PIL
+            Same pixels as qr.make_image(fill_color="black", back_color="white"),
+            the matrix is scaled with numpy instead of drawing every box as a rectangle.
+
+        Returns: png bytes
+        """
+        box_size = self.qr.box_size
+        modules = np.array(self.qr.modules, dtype=bool)
+        modules = np.pad(modules, self.qr.border, mode='constant', constant_values=False)
+        # 1 is white in 1-bit grayscale, dark modules are 0
+        pixels = np.repeat(np.repeat(~modules, box_size, axis=0), box_size, axis=1)
+        height, width = pixels.shape
+
+        rows = np.packbits(pixels, axis=1)
+        # every scanline starts with filter type 0 (None)
+        scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows])
+
+        return b''.join([
+            b'\x89PNG\r\n\x1a\n',
+            _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0)),
+            _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes())),
+            _png_chunk(b'IEND', b''),
+        ])
+
+
+def _png_chunk(chunk_type, data):
+    return b''.join([
+        struct.pack('>I', len(data)),
+        chunk_type,
+        data,
+        struct.pack('>I', zlib.crc32(chunk_type + data)),
+    ])
+
+
+CHUNK_HEADER_PREFIX = 'HQR'
+
+
+def _chunk_header(index, total, checksum):
+    return "{}:{}/{}:{:08x}:".format(CHUNK_HEADER_PREFIX, index, total, checksum)
+
+
+def _parse_chunk(chunk):
+    try:
+        prefix, position, checksum, payload = chunk.split(':', 3)
+        index, total = map(int, position.split('/'))
+        checksum = int(checksum, 16)
+    except ValueError:
+        raise Exception('{}: not a qrcode chunk.'.format(chunk[:32]))
+
+    if prefix != CHUNK_HEADER_PREFIX:
+        raise Exception('{}: not a qrcode chunk.'.format(chunk[:32]))
+
+    return index, total, checksum, payload
 
-        img.save(save_path)
+
+def _render_chunk(chunk, qrcode_kwargs, save_path=None):
+    """
+    Desc: encode one chunk, runs inside a worker process
+    Args:
+        chunk: chunk text with header
+        qrcode_kwargs: keyword arguments for QRCode
+        save_path: write png to this path, or return png bytes when None
+
+    Returns: save path or png bytes
+    """
+    qr = QRCode(chunk, fit=True, **qrcode_kwargs)
+
+    if save_path is not None:
+        return qr.create_qrcode_png(save_path)
+
+    return qr.make_png_bytes()
+
+
+class QRCodeChunks(object):
+    def __init__(
+            self, data,
+            chunk_size=1024, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4,
+            max_workers=None
+        ):
+        """
+        Desc: split a payload too large for one qrcode into a sequence of qrcodes
+            Every chunk is a text envelope: HQR:<index>/<total>:<crc32>:<payload>
+            index starts from 1, crc32 is calculated over the whole compressed payload,
+            so chunks from different payloads can not be mixed up on reassembly.
+        Args:
+            data: json data.
+            chunk_size: payload characters per qrcode, see max_chunk_size, about 2930 with ERROR_CORRECT_L.
+            error_correction: same as QRCode
+            box_size: same as QRCode
+            border: same as QRCode
+            max_workers: the number of processes to encode chunks, default is the number of cpus.
+
+        Returns: None
+        """
+
+        self.data = data
+        self.chunk_size = chunk_size
+        self.error_correction = error_correction
+        self.box_size = box_size
+        self.border = border
+        self.max_workers = max_workers
+
+        if self.chunk_size <= 0:
+            raise Exception('chunk_size: must be greater than 0, got {}.'.format(self.chunk_size))
+
+        self.chunks = self.split()
+
+        max_chunk_size = self.max_chunk_size(len(self.chunks))
+        if self.chunk_size > max_chunk_size:
+            raise Exception('chunk_size: {} does not fit in a version 40 qrcode, the max is {}.'.format(
+                self.chunk_size, max_chunk_size
+            ))
+
+    def max_chunk_size(self, total):
+        # 8 bit byte mode: 4 bits mode indicator + 16 bits length, then 8 bits per character
+        capacity = (qrcode.util.BIT_LIMIT_TABLE[self.error_correction][40] - 4 - 16) // 8
+
+        return capacity - len(_chunk_header(total, total, 0))
+
+    def split(self):
+        payload = QRCode.compress(self.data)
+        checksum = zlib.crc32(payload.encode('utf-8'))
+        parts = [payload[i:i + self.chunk_size] for i in range(0, len(payload), self.chunk_size)]
+        total = len(parts)
+
+        return [_chunk_header(n, total, checksum) + part for n, part in enumerate(parts, 1)]
+
+    def _map(self, save_paths):
+        qrcode_kwargs = {
+            "error_correction": self.error_correction,
+            "box_size": self.box_size,
+            "border": self.border,
+        }
+
+        if len(self.chunks) == 1 or self.max_workers == 1:
+            return [_render_chunk(c, qrcode_kwargs, p) for c, p in zip(self.chunks, save_paths)]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(
+                _render_chunk,
+                self.chunks,
+                [qrcode_kwargs] * len(self.chunks),
+                save_paths,
+            ))
+
+    def create_qrcode_pngs(self, save_dir='/tmp', prefix='qrcode'):
+        """
+        Desc: write every chunk as a numbered png, e.g. /tmp/qrcode_01_of_12.png
+
+        Returns: list of save path
+        """
+        total = len(self.chunks)
+        width = len(str(total))
+        save_paths = [
+            os.path.join(save_dir, "{}_{:0{w}d}_of_{}.png".format(prefix, n, total, w=width))
+            for n in range(1, total + 1)
+        ]
+
+        return self._map(save_paths)
+
+    def create_qrcode_sprite(self, save_path='/tmp/qrcode_sprite.png', columns=4):
+        """
+        Desc: write all chunks into a single sprite sheet, left to right and top to bottom
+
+        Returns: save path
+        """
+        from PIL import Image
+
+        images = [Image.open(io.BytesIO(png)) for png in self._map([None] * len(self.chunks))]
+        cell = max(img.size[0] for img in images)
+        columns = min(columns, len(images))
+        rows = (len(images) + columns - 1) // columns
+
+        sprite = Image.new('1', (cell * columns, cell * rows), 255)
+        for n, img in enumerate(images):
+            sprite.paste(img, ((n % columns) * cell, (n // columns) * cell))
+
+        sprite.save(save_path)
 
         return save_path
 
 
+def reassemble_chunks(chunks):
+    """
+    Desc: join the decoded texts of QRCodeChunks back into the original data
+    Args:
+        chunks: decoded chunk texts, in any order
+
+    Returns: decompressed data
+    """
+    parsed = sorted(_parse_chunk(c) for c in set(chunks))
+    totals = {total for _, total, _, _ in parsed}
+    checksums = {checksum for _, _, checksum, _ in parsed}
+
+    if len(totals) != 1 or len(checksums) != 1:
+        raise Exception('chunks belong to different payloads.')
+
+    total = totals.pop()
+    indexes = [index for index, _, _, _ in parsed]
+    if indexes != list(range(1, total + 1)):
+        missing = sorted(set(range(1, total + 1)) - set(indexes))
+        raise Exception('missing chunks: {}.'.format(missing) if missing else 'duplicated chunks.')
+
+    payload = ''.join(p for _, _, _, p in parsed)
+    if zlib.crc32(payload.encode('utf-8')) != checksums.pop():
+        raise Exception('chunks checksum mismatch.')
+
+    return QRCode.decompress(payload)
+
+
 if __name__ == "__main__":
     data = {"name": "Panda", "sex": "male", "age": 17, "job": "Engineer"}
     qr = QRCode(data, fit=True, compress_switch=True)
@@ -113,3 +330,9 @@ if __name__ == "__main__":
 
     # version size
     print(qr.get_well_matched_version_number())
+
+    # payload larger than a single qrcode
+    # chunks = QRCodeChunks(big_data)
+    # print(chunks.create_qrcode_pngs())
+    # print(chunks.create_qrcode_sprite())
+    # print(reassemble_chunks(decoded_texts))
@@ -251,8 +251,7 @@ class MortgageSmartCalculator(object):
         print(r2_msg)
 
 
-def hacker_args():
-    parser = argparse.ArgumentParser()
+def add_hacker_args(parser):
     parser.add_argument(
         "-a",
         "--loan_amount",
@@ -279,6 +278,12 @@ def hacker_args():
         help="还款月序号"
     )
 
+    return parser
+
+
+def hacker_args():
+    parser = add_hacker_args(argparse.ArgumentParser())
+
     args = parser.parse_args()
     args_dict = vars(args)
 